@@ -0,0 +1,46 @@
+"""Compare util.emails against the str.replace chain previously used by tidyhq_remind
+
+The replace chain is faster but produces broken links and doesn't escape invoice
+names. This measures what parsing and escaping properly costs per email.
+
+Run from the repository root: python -m benchmarks.email_render
+"""
+
+import timeit
+
+from util import emails
+
+name = "Jane Citizen"
+header = f"{name} owes $245.5 across 25 invoices"
+old_message = "• " + "\n• ".join(
+    f"$9.82 - <https://artifactory.tidyhq.com/finances/invoices/inv{i}|Membership {i}> (Due {i + 7} days ago)"
+    for i in range(25)
+)
+
+
+def replace_chain() -> str:
+    parts = header.split("$")
+    message = f"Hello {name},\n\nAs a reminder you have an outstanding balance of ${parts[1]}. (Excluding invoices that aren't at least 7 days overdue)"
+    message += f"\n\n{old_message.replace('https://artifactory.tidyhq.com/finances/invoices/', 'https://artifactory.tidyhq.com/public/invoices/')}"
+    message = message.replace("<", "<a href='").replace("|", "'>").replace(">", "</a>")
+    message += '\n\nIf you have any questions or concerns, please don\'t hesitate to reach out to us at <a href="mailto:treasurer@artifactory.org.au">treasurer@artifactory.org.au</a>.\n\nThank you for your support,\nArtifactory Committee'
+    return message.replace("\n", "<br>")
+
+
+def rendered() -> str:
+    parts = header.split("$")
+    return emails.reminder(
+        name=name,
+        total=parts[1],
+        invoices=emails.parse_invoices(old_message),
+        public_url="https://artifactory.tidyhq.com/public/invoices/{}",
+        contact_email="treasurer@artifactory.org.au",
+        signature="Artifactory Committee",
+    )
+
+
+if __name__ == "__main__":
+    runs = 2000
+    for label, func in (("replace chain", replace_chain), ("util.emails", rendered)):
+        seconds = timeit.timeit(func, number=runs)
+        print(f"{label:>14}: {seconds / runs * 1e6:8.1f} µs per email")
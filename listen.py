@@ -1,14 +1,16 @@
-import json
+import html
 import logging
-import re
 from copy import deepcopy as copy
 from pprint import pprint
 
-import requests
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
+from slack_bolt.authorization import AuthorizeResult
 
-from util import blocks
+from util import blocks, emails, tenants
+from util.invoices import InvoiceCache
+from util.lanes import Lane
+from util.ledger import Ledger
 
 # Set up logging
 logging.basicConfig(
@@ -17,21 +19,129 @@ logging.basicConfig(
 )
 
 # Load config
-with open("config.json", "r") as f:
-    config: dict = json.load(f)
+shared, tenant_configs = tenants.load()
 
 # Debug info
 debug_slack_id = None
 debug_tidyhq_id = None
-if config["debug"]:
+if shared["debug"]:
     debug_slack_id = "UC6T4U150"
     debug_tidyhq_id = 1952718
-    config["slack"]["admin_channel"] = "C05HB2Z82CT"
     logging.info("Debug mode enabled. Using debug IDs.")
 else:
     logging.info("Debug mode disabled. Using live IDs.")
 
-app = App(token=config["slack"]["bot_token"])
+
+def authorize(enterprise_id, team_id, logger):
+    # Tenants in different workspaces each have their own bot token
+    for tenant in tenant_configs.values():
+        if tenant["slack"].get("team_id") == team_id:
+            return AuthorizeResult(
+                enterprise_id=enterprise_id,
+                team_id=team_id,
+                bot_token=tenant["slack"]["bot_token"],
+            )
+    logger.error(f"No tenant configured for workspace {team_id}")
+
+
+# Only use per workspace authorization when tenants are spread across workspaces
+bot_tokens = {tenant["slack"]["bot_token"] for tenant in tenant_configs.values()}
+if len(bot_tokens) == 1:
+    app = App(token=bot_tokens.pop())
+else:
+    app = App(authorize=authorize)
+
+# Each tenant gets its own HTTP pool and rate limit budget
+sessions = {
+    tenant_id: tenants.session(tenant) for tenant_id, tenant in tenant_configs.items()
+}
+
+# Invoice statuses are cached briefly so handlers don't act on invoices that have since been paid
+invoice_caches = {
+    tenant_id: InvoiceCache(
+        url=tenant["urls"]["invoices"],
+        token=tenant["tidyhq"]["token"],
+        ttl=tenant.get("invoice_cache_ttl", 300),
+        session=sessions[tenant_id],
+    )
+    for tenant_id, tenant in tenant_configs.items()
+}
+
+# Member facing actions get their own lane so they aren't stuck behind admin actions that make many TidyHQ requests
+lane_config = tenants.merge(
+    {"fast": {"workers": 8, "queue": 100}, "slow": {"workers": 2, "queue": 20}},
+    shared.get("lanes", {}),
+)
+fast_lane = Lane("fast", **lane_config["fast"])
+slow_lane = Lane("slow", **lane_config["slow"])
+
+# Reminders, deletions and member responses are recorded locally so reports can show when a contact was last reminded
+ledgers = {
+    tenant_id: Ledger(tenant["ledger"]) for tenant_id, tenant in tenant_configs.items()
+}
+
+
+def get_tenant(body: dict, client) -> dict | None:
+    """Route an interaction to its tenant, letting whoever clicked know if that isn't possible"""
+    tenant = tenants.route(tenant_configs, body)
+    if not tenant:
+        client.chat_postEphemeral(  # type: ignore
+            channel=body["container"]["channel_id"],
+            user=body["user"]["id"],
+            text="Sorry, we couldn't work out which organisation this belongs to. Please contact the treasurer directly.",
+        )
+    return tenant
+
+
+def check_outstanding(
+    tenant: dict, client, old_message: str, balance: str, name: str
+) -> tuple[str, str, list[dict]]:
+    """Drop invoices that are no longer outstanding from a report message and let the admin channel know.
+
+    Returns the trimmed message, the recalculated balance and the invoices that are still outstanding.
+    If the message can't be fully parsed no invoices are returned so that no action is taken.
+    """
+    # Parse the invoice list once so IDs, lines and totals always agree
+    lines = [line for line in old_message.split("\n") if line.strip()]
+    invoices = emails.parse_invoices(old_message)
+    if len(invoices) != len(lines):
+        logging.error(
+            f"Could only parse {len(invoices)} of {len(lines)} invoice lines for {name}"
+        )
+        client.chat_postMessage(  # type: ignore
+            channel=tenant["slack"]["admin_channel"],
+            text=f"Couldn't read the invoice list for {name}. No action was taken.",
+        )
+        return old_message, balance, []
+
+    outstanding, skipped = invoice_caches[tenant["id"]].outstanding(
+        [invoice["id"] for invoice in invoices]
+    )
+    if not skipped:
+        return old_message, balance, invoices
+
+    skipped_links = ", ".join(
+        f"<{tenant['tidyhq']['url']}/finances/invoices/{invoice_id}|{invoice_id}>"
+        for invoice_id in skipped
+    )
+    client.chat_postMessage(  # type: ignore
+        channel=tenant["slack"]["admin_channel"],
+        text=f"Skipped {len(skipped)} {'invoice' if len(skipped) == 1 else 'invoices'} for {name} that {'is' if len(skipped) == 1 else 'are'} no longer outstanding: {skipped_links}"
+        + ("" if outstanding else ". No further action was taken."),
+    )
+
+    # Remove the skipped invoices from the list and recalculate the balance
+    kept = [
+        (line, invoice)
+        for line, invoice in zip(lines, invoices)
+        if invoice["id"] not in skipped
+    ]
+    old_message = "\n".join(line for line, _ in kept)
+    invoices = [invoice for _, invoice in kept]
+    total = sum(float(invoice["amount"].replace(",", "")) for invoice in invoices)
+    balance = f"{total:.2f} across {len(invoices)} {'invoice' if len(invoices) == 1 else 'invoices'}"
+
+    return old_message, balance, invoices
 
 
 @app.action("view_invoices_admin")
@@ -41,8 +151,12 @@ def view_invoices_admin(ack, body, logger):
 
 
 @app.action("slack_remind")
-def slack_remind_button(ack, body, logger):
-    ack()
+@slow_lane.listener
+def slack_remind_button(body, client, logger):
+    # Work out which organisation this interaction belongs to
+    tenant = get_tenant(body, client)
+    if not tenant:
+        return
 
     # Retrieve the target's slack user ID and tidyhq contact ID
     tidyhq_id, slack_id = body["actions"][0]["value"].split("_")
@@ -65,18 +179,27 @@ def slack_remind_button(ack, body, logger):
 
     message: str = ""
     if header and old_message:
-        # The original header included the members name so we'll replace it with you
-        parts = header.split("$")
-        message = f"As a reminder you have an outstanding balance of ${parts[1]}. (Excluding invoices that aren't at least 7 days overdue)"
-
         # Get the contact's name
         name = header.split(" owes $")[0]
 
-        # Get the total invoice amount
-        total_owed = parts[1].split(".")[0]
+        # Drop any invoices that have been paid since the report was posted
+        parts = header.split("$")
+        old_message, balance, invoices = check_outstanding(
+            tenant, client, old_message, parts[1], name
+        )
+        if not invoices:
+            return
+        invoice_ids = [invoice["id"] for invoice in invoices]
+
+        # The original header included the members name so we'll replace it with you
+        message = f"As a reminder you have an outstanding balance of ${balance}. (Excluding invoices that aren't at least 7 days overdue)"
 
         # The original message included internal links that only work for admins, replace them with the public version
-        message += f"\n\n{old_message.replace('https://artifactory.tidyhq.com/finances/invoices/', 'https://artifactory.tidyhq.com/public/invoices/')}"
+        public_message = old_message.replace(
+            f"{tenant['tidyhq']['url']}/finances/invoices/",
+            f"{tenant['tidyhq']['url']}/public/invoices/",
+        )
+        message += f"\n\n{public_message}"
 
         # Set up blocks
         block_list: list[dict] = []
@@ -95,10 +218,13 @@ def slack_remind_button(ack, body, logger):
         # Set up action block
         action_block = copy(blocks.actions)
 
+        # Tag the action block with the tenant so the member's response can be routed back
+        action_block["block_id"] = tenant["id"]
+
         # Create pay invoices button
         pay_invoices_button = copy(blocks.link_button)
         pay_invoices_button["text"]["text"] = "Pay"
-        pay_invoices_button["url"] = f"https://artifactory.tidyhq.com/member/invoices"
+        pay_invoices_button["url"] = f"{tenant['tidyhq']['url']}/member/invoices"
         pay_invoices_button["action_id"] = "view_invoices"
         pay_invoices_button["value"] = f"{tidyhq_id}_{slack_id}"
         pay_invoices_button["style"] = "primary"
@@ -131,33 +257,36 @@ def slack_remind_button(ack, body, logger):
         block_list.append(action_block)
 
         # Open a slack conversation with the member and get the channel ID
-        r: SlackResponse = app.client.conversations_open(users=slack_id)  # type: ignore
+        r: SlackResponse = client.conversations_open(users=slack_id)  # type: ignore
         channel_id: str = str(r["channel"]["id"])  # type: ignore
 
         # Notify the member
-        app.client.chat_postMessage(  # type: ignore
+        client.chat_postMessage(  # type: ignore
             channel=channel_id,
             text=message,
             blocks=block_list,
         )
 
         # Send notification to admin channel that member has been reminded
-        app.client.chat_postMessage(  # type: ignore
-            channel=config["slack"]["admin_channel"],
-            text=f"<@{slack_id}> has been reminded to pay their <https://artifactory.tidyhq.com/contacts/{tidyhq_id}/finances|invoices> by <@{body['user']['id']}> via slack.",
+        client.chat_postMessage(  # type: ignore
+            channel=tenant["slack"]["admin_channel"],
+            text=f"<@{slack_id}> has been reminded to pay their <{tenant['tidyhq']['url']}/contacts/{tidyhq_id}/finances|invoices> by <@{body['user']['id']}> via slack.",
+        )
+        ledgers[tenant["id"]].append(
+            tidyhq_id,
+            "reminded",
+            via="slack",
+            by=body["user"]["id"],
+            invoices=invoice_ids,
         )
 
         # Add a note to each invoice in TidyHQ that a reminder has been sent
 
-        # Get the IDs of each invoice
-        p = re.compile(r"/invoices/([a-zA-Z0-9_]*)")
-        invoice_ids = p.findall(old_message)
-
         for invoice_id in invoice_ids:
-            r = requests.post(
-                config["urls"]["invoice_note"].format(invoice_id),
+            r = sessions[tenant["id"]].post(
+                tenant["urls"]["invoice_note"].format(invoice_id),
                 params={
-                    "access_token": config["tidyhq"]["token"],
+                    "access_token": tenant["tidyhq"]["token"],
                     "text": f"{name} was reminded about this invoice via Slack (User: {slack_id}).",
                 },
             )
@@ -165,8 +294,12 @@ def slack_remind_button(ack, body, logger):
 
 
 @app.action("tidyhq_remind")
-def tidyhq_remind_button(ack, body, logger):
-    ack()
+@slow_lane.listener
+def tidyhq_remind_button(body, client, logger):
+    # Work out which organisation this interaction belongs to
+    tenant = get_tenant(body, client)
+    if not tenant:
+        return
 
     # Retrieve the target's slack user ID (junk) and tidyhq contact ID
     tidyhq_id, slack_id = body["actions"][0]["value"].split("_")
@@ -191,62 +324,69 @@ def tidyhq_remind_button(ack, body, logger):
         # Get the contact's name
         name = header.split(" owes $")[0]
 
-        # The original header included the members name so we'll replace it with you
+        # Drop any invoices that have been paid since the report was posted
         parts = header.split("$")
-        message = f"Hello {name},\n\nAs a reminder you have an outstanding balance of ${parts[1]}. (Excluding invoices that aren't at least 7 days overdue)"
-
-        # Get the total invoice amount
-        total_owed = parts[1].split(".")[0]
-
-        # The original message included internal links that only work for admins, replace them with the public version
-        message += f"\n\n{old_message.replace('https://artifactory.tidyhq.com/finances/invoices/', 'https://artifactory.tidyhq.com/public/invoices/')}"
-
-        # Slack urls need to be reformatted for HTML/email
-        message = (
-            message.replace("<", "<a href='").replace("|", "'>").replace(">", "</a>")
+        old_message, balance, invoices = check_outstanding(
+            tenant, client, old_message, parts[1], name
+        )
+        if not invoices:
+            return
+        invoice_ids = [invoice["id"] for invoice in invoices]
+
+        # Render the email from the invoices listed in the original message, linking to the public version of each invoice
+        # Slack escapes &, < and > in message text, undo that before they're escaped for the email
+        message = emails.reminder(
+            name=html.unescape(name),
+            total=html.unescape(balance),
+            invoices=invoices,
+            public_url=tenant["tidyhq"]["url"] + "/public/invoices/{}",
+            contact_email=tenant["email"]["contact"],
+            signature=tenant["email"]["signature"],
         )
-
-        message += '\n\nIf you have any questions or concerns, please don\'t hesitate to reach out to us at <a href="mailto:treasurer@artifactory.org.au">treasurer@artifactory.org.au</a>.\n\nThank you for your support,\nArtifactory Committee'
-
-        # Since this is being sent via an email replace newlines with <br> tags
-        message = message.replace("\n", "<br>")
 
         # Send a reminder via TidyHQ
-        r = requests.post(
-            config["urls"]["emails"],
+        r = sessions[tenant["id"]].post(
+            tenant["urls"]["emails"],
             params={
-                "access_token": config["tidyhq"]["token"],
-                "subject": "Reminder: You have outstanding invoices with the Artifactory",
+                "access_token": tenant["tidyhq"]["token"],
+                "subject": f"Reminder: You have outstanding invoices with {tenant['name']}",
                 "body": message,
                 "contacts": [tidyhq_id],
             },
         )
 
         # Send notification to admin channel that member has been reminded
-        app.client.chat_postMessage(  # type: ignore
-            channel=config["slack"]["admin_channel"],
-            text=f"<https://artifactory.tidyhq.com/contacts/{tidyhq_id}|{name}> has been reminded to pay their <https://artifactory.tidyhq.com/contacts/{tidyhq_id}/finances|invoices> by <@{body['user']['id']}> via email.",
+        client.chat_postMessage(  # type: ignore
+            channel=tenant["slack"]["admin_channel"],
+            text=f"<{tenant['tidyhq']['url']}/contacts/{tidyhq_id}|{name}> has been reminded to pay their <{tenant['tidyhq']['url']}/contacts/{tidyhq_id}/finances|invoices> by <@{body['user']['id']}> via email.",
+        )
+        ledgers[tenant["id"]].append(
+            tidyhq_id,
+            "reminded",
+            via="email",
+            by=body["user"]["id"],
+            invoices=invoice_ids,
         )
 
         # Add a note to each invoice in TidyHQ that a reminder has been sent
 
-        # Get the IDs of each invoice
-        p = re.compile(r"/invoices/([a-zA-Z0-9_]*)")
-        invoice_ids = p.findall(old_message)
-
         for invoice_id in invoice_ids:
-            r = requests.post(
-                config["urls"]["invoice_note"].format(invoice_id),
+            r = sessions[tenant["id"]].post(
+                tenant["urls"]["invoice_note"].format(invoice_id),
                 params={
-                    "access_token": config["tidyhq"]["token"],
+                    "access_token": tenant["tidyhq"]["token"],
                     "text": f"{name} was reminded about this invoice via email.",
                 },
             )
 
 
 @app.action("delete_invoices")
-def delete_invoices(ack, body, logger):
-    ack()
+@slow_lane.listener
+def delete_invoices(body, client, logger):
+    # Work out which organisation this interaction belongs to
+    tenant = get_tenant(body, client)
+    if not tenant:
+        return
 
     # Retrieve the target's slack user ID (junk) and tidyhq contact ID
     tidyhq_id, slack_id = body["actions"][0]["value"].split("_")
@@ -271,46 +411,59 @@ def delete_invoices(ack, body, logger):
         # Get the contact's name
         name = header.split(" owes $")[0]
 
-        # The original header included the members name so we'll replace it with you
+        # Don't delete any invoices that have been paid since the report was posted
         parts = header.split("$")
-        message = f"Hello {name},\n\nAs a reminder you have an outstanding balance of ${parts[1]}. (Excluding invoices that aren't at least 7 days overdue)"
-
-        # Get the total invoice amount
-        total_owed = parts[1].split(".")[0]
+        old_message, balance, invoices = check_outstanding(
+            tenant, client, old_message, parts[1], name
+        )
 
         # Delete each listed invoice
+        for invoice in invoices:
+            invoice_id = invoice["id"]
 
-        # Get the IDs of each invoice
-        p = re.compile(r"/invoices/([a-zA-Z0-9_]*)")
-        invoice_ids = p.findall(old_message)
-
-        for invoice_id in invoice_ids:
             # Delete the invoice
-            r = requests.delete(
-                config["urls"]["invoice"].format(invoice_id),
+            r = sessions[tenant["id"]].delete(
+                tenant["urls"]["invoice"].format(invoice_id),
                 params={
-                    "access_token": config["tidyhq"]["token"],
+                    "access_token": tenant["tidyhq"]["token"],
                 },
             )
+            if not r.ok:
+                logging.error(
+                    f"Could not delete invoice {invoice_id} for {name}: {r.status_code}"
+                )
+                client.chat_postMessage(  # type: ignore
+                    channel=tenant["slack"]["admin_channel"],
+                    text=f"<{tenant['tidyhq']['url']}/finances/invoices/{invoice_id}|An invoice> for {name} could not be deleted (TidyHQ returned {r.status_code}).",
+                )
+                continue
+            invoice_caches[tenant["id"]].close(invoice_id)
 
             # Leave a note on the invoice that it was deleted
-            r = requests.post(
-                config["urls"]["invoice_note"].format(invoice_id),
+            r = sessions[tenant["id"]].post(
+                tenant["urls"]["invoice_note"].format(invoice_id),
                 params={
-                    "access_token": config["tidyhq"]["token"],
+                    "access_token": tenant["tidyhq"]["token"],
                     "text": f"This invoice was deleted by {slack_id} via Slack.",
                 },
             )
 
-            app.client.chat_postMessage(  # type: ignore
-                channel=config["slack"]["admin_channel"],
-                text=f"<https://artifactory.tidyhq.com/finances/invoices/{invoice_id}|An invoice> for {name} was deleted by <@{body['user']['id']}>.",
+            client.chat_postMessage(  # type: ignore
+                channel=tenant["slack"]["admin_channel"],
+                text=f"<{tenant['tidyhq']['url']}/finances/invoices/{invoice_id}|An invoice> for {name} was deleted by <@{body['user']['id']}>.",
+            )
+            ledgers[tenant["id"]].append(
+                tidyhq_id, "deleted", by=body["user"]["id"], invoice=invoice_id
             )
 
 
 @app.action("view_invoices")
-def view_invoices(ack, body, logger):
-    ack()
+@fast_lane.listener
+def view_invoices(body, client, logger):
+    # Work out which organisation this interaction belongs to
+    tenant = get_tenant(body, client)
+    if not tenant:
+        return
 
     # Retrieve the target's slack user ID and tidyhq contact ID
     tidyhq_id, slack_id = body["actions"][0]["value"].split("_")
@@ -323,22 +476,28 @@ def view_invoices(ack, body, logger):
         tidyhq_id = debug_tidyhq_id
 
     # Send notification to admin channel that member is paying
-    app.client.chat_postMessage(  # type: ignore
-        channel=config["slack"]["admin_channel"],
-        text=f"<@{slack_id}> has agreed to pay their <https://artifactory.tidyhq.com/contacts/{tidyhq_id}/finances|invoices>",
+    client.chat_postMessage(  # type: ignore
+        channel=tenant["slack"]["admin_channel"],
+        text=f"<@{slack_id}> has agreed to pay their <{tenant['tidyhq']['url']}/contacts/{tidyhq_id}/finances|invoices>",
     )
 
     # Thank the user
-    app.client.chat_postEphemeral(  # type: ignore
+    client.chat_postEphemeral(  # type: ignore
         channel=body["container"]["channel_id"],
         user=slack_id,
         text="Thank you for paying, your support is greatly appreciated!",
     )
+    ledgers[tenant["id"]].append(tidyhq_id, "response", response="paying")
 
 
 @app.action("already_paid")
-def already_paid(ack, body, logger):
-    ack()
+@fast_lane.listener
+def already_paid(body, client, logger):
+    # Work out which organisation this interaction belongs to
+    tenant = get_tenant(body, client)
+    if not tenant:
+        return
+
     # Retrieve the target's slack user ID and tidyhq contact ID
     tidyhq_id, slack_id = body["actions"][0]["value"].split("_")
 
@@ -350,24 +509,29 @@ def already_paid(ack, body, logger):
         tidyhq_id = debug_tidyhq_id
 
     # Send notification to admin channel that member is paying
-    app.client.chat_postMessage(  # type: ignore
-        channel=config["slack"]["admin_channel"],
-        text=f"<@{slack_id}> has indicated that they've already paid their <https://artifactory.tidyhq.com/contacts/{tidyhq_id}/finances|invoices>",
+    client.chat_postMessage(  # type: ignore
+        channel=tenant["slack"]["admin_channel"],
+        text=f"<@{slack_id}> has indicated that they've already paid their <{tenant['tidyhq']['url']}/contacts/{tidyhq_id}/finances|invoices>",
     )
 
     # Thank the user
-    app.client.chat_postEphemeral(  # type: ignore
+    client.chat_postEphemeral(  # type: ignore
         channel=body["container"]["channel_id"],
         user=slack_id,
         text="Thanks for letting us know you've already paid. Payments made via bank transfer will be reconciled within a few days.",
     )
+    ledgers[tenant["id"]].append(tidyhq_id, "response", response="already_paid")
 
 
 @app.action("need_help")
-def need_help(ack, body, logger):
-    ack()
+@fast_lane.listener
+def need_help(body, client, logger):
+    # Work out which organisation this interaction belongs to
+    tenant = get_tenant(body, client)
+    if not tenant:
+        return
 
-    admin_contact = ",".join([config["slack"]["admins"]["treasurer"]])
+    admin_contact = ",".join([tenant["slack"]["admins"]["treasurer"]])
 
     # Format the admin contact list for display
     admin_contact_formatted = ", ".join(f"<@{id}>" for id in admin_contact.split(","))
@@ -383,7 +547,7 @@ def need_help(ack, body, logger):
         tidyhq_id = debug_tidyhq_id
 
     # Open a slack conversation with the member and get the channel ID
-    r = app.client.conversations_open(users=",".join([slack_id, admin_contact]))
+    r = client.conversations_open(users=",".join([slack_id, admin_contact]))
     channel_id = r["channel"]["id"]
 
     block_list = []
@@ -404,36 +568,41 @@ def need_help(ack, body, logger):
             block_list[-1]["block_id"] = "message"
 
     # Post an opener to the DM
-    app.client.chat_postMessage(  # type: ignore
+    client.chat_postMessage(  # type: ignore
         channel=channel_id,
         text=f"<@{slack_id}> has indicated they're unable to pay their outstanding invoices.",
         blocks=block_list,
     )
 
     # Send an ephemeral message to the user to let them know we've opened a conversation with the treasurer
-    app.client.chat_postEphemeral(  # type: ignore
+    client.chat_postEphemeral(  # type: ignore
         channel=channel_id,
         user=slack_id,
         text=f"This is a direct message to the treasurer ({admin_contact_formatted}) to let them know you need help. They'll be in touch soon.",
     )
 
     # Notify the admin channel that the member needs help and a conversation has been opened
-    app.client.chat_postMessage(  # type: ignore
-        channel=config["slack"]["admin_channel"],
-        text=f"<@{slack_id}> has indicated there's something wrong with their <https://artifactory.tidyhq.com/contacts/{tidyhq_id}/finances|outstanding invoices> and a conversation has been opened between them and: {admin_contact_formatted}",
+    client.chat_postMessage(  # type: ignore
+        channel=tenant["slack"]["admin_channel"],
+        text=f"<@{slack_id}> has indicated there's something wrong with their <{tenant['tidyhq']['url']}/contacts/{tidyhq_id}/finances|outstanding invoices> and a conversation has been opened between them and: {admin_contact_formatted}",
     )
+    ledgers[tenant["id"]].append(tidyhq_id, "response", response="need_help")
 
     # pprint(body)
 
 
 @app.action("looks_wrong")
-def looks_wrong(ack, body, logger):
-    ack()
+@fast_lane.listener
+def looks_wrong(body, client, logger):
+    # Work out which organisation this interaction belongs to
+    tenant = get_tenant(body, client)
+    if not tenant:
+        return
 
     admin_contact = ",".join(
         [
-            config["slack"]["admins"]["treasurer"],
-            config["slack"]["admins"]["membership"],
+            tenant["slack"]["admins"]["treasurer"],
+            tenant["slack"]["admins"]["membership"],
         ]
     )
 
@@ -451,7 +620,7 @@ def looks_wrong(ack, body, logger):
         tidyhq_id = debug_tidyhq_id
 
     # Open a slack conversation with the member and get the channel ID
-    r = app.client.conversations_open(users=",".join([slack_id, admin_contact]))
+    r = client.conversations_open(users=",".join([slack_id, admin_contact]))
     channel_id = r["channel"]["id"]
 
     block_list = []
@@ -472,26 +641,30 @@ def looks_wrong(ack, body, logger):
             block_list[-1]["block_id"] = "message"
 
     # Post an opener to the DM
-    app.client.chat_postMessage(  # type: ignore
+    client.chat_postMessage(  # type: ignore
         channel=channel_id,
         text=f"<@{slack_id}> has indicated there's something wrong with their outstanding invoices.",
         blocks=block_list,
     )
 
     # Send an ephemeral message to the user to let them know we've opened a conversation with the treasurer
-    app.client.chat_postEphemeral(  # type: ignore
+    client.chat_postEphemeral(  # type: ignore
         channel=channel_id,
         user=slack_id,
         text=f"This is a direct message to the treasurer and membership officer ({admin_contact_formatted}) to let them know you need help. They'll be in touch soon.",
     )
 
     # Notify the admin channel that the member needs help and a conversation has been opened
-    app.client.chat_postMessage(  # type: ignore
-        channel=config["slack"]["admin_channel"],
-        text=f"<@{slack_id}> has indicated there's something wrong with their <https://artifactory.tidyhq.com/contacts/{tidyhq_id}/finances|outstanding invoices> and a conversation has been opened between them and: {admin_contact_formatted}",
+    client.chat_postMessage(  # type: ignore
+        channel=tenant["slack"]["admin_channel"],
+        text=f"<@{slack_id}> has indicated there's something wrong with their <{tenant['tidyhq']['url']}/contacts/{tidyhq_id}/finances|outstanding invoices> and a conversation has been opened between them and: {admin_contact_formatted}",
     )
+    ledgers[tenant["id"]].append(tidyhq_id, "response", response="looks_wrong")
 
 
 # Open socket mode
 if __name__ == "__main__":
-    SocketModeHandler(app, config["slack"]["app_token"]).start()
+    # Warm the invoice cache so the first click doesn't wait on TidyHQ
+    for invoice_cache in invoice_caches.values():
+        invoice_cache.outstanding([])
+    SocketModeHandler(app, shared["slack"]["app_token"]).start()
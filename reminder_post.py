@@ -1,212 +1,295 @@
-import json
-import requests
 import logging
 import sys
-from pprint import pprint
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy as copy
+from datetime import datetime, timedelta
+
+import requests
 from slack_bolt import App
+from slack_sdk.http_retry.builtin_handlers import RateLimitErrorRetryHandler
 
-from util import blocks
+from util import blocks, tenants
+from util.ledger import Ledger
 
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
+    format="%(asctime)s - %(levelname)s - %(processName)s - %(message)s",
 )
 
-# Load config
-with open("config.json", "r") as f:
-    config: dict = json.load(f)
-
-# Debug channel
-if config["debug"]:
-    config["slack"]["admin_channel"] = "C05HB2Z82CT"
-
-# Set up Slack app
-app = App(token=config["slack"]["bot_token"])
-
-# Get a list of all invoices
-try:
-    # create datetime for 90 days ago
-    query_date = datetime.now() - timedelta(days=90)
-    logging.info("Getting invoices from TidyHQ")
-    r = requests.get(
-        config["urls"]["invoices"],
-        params={
-            "access_token": config["tidyhq"]["token"],
-            "limit": 10000,
-            "updated_since": query_date.isoformat(),
-        },
-    )
-    invoices = r.json()
-except requests.exceptions.RequestException as e:
-    logging.error("Could not reach TidyHQ")
-    sys.exit(1)
-
-logging.debug(f"Found {len(invoices)} invoices")
-
-# Trim invoices to only include those that have not been paid
-invoices = [invoice for invoice in invoices if not invoice["paid"]]
-
-# TidyHQ includes a lot of extra data in the invoices, so we'll trim it down to just the fields we need
-from datetime import datetime
-
-invoices = [
-    {
-        "id": invoice["id"],
-        "amount": invoice["outstanding_amount"],
-        "due_date": datetime.strptime(invoice["due_date"], "%Y-%m-%d"),
-        "contact_id": invoice["contact"]["contact_id_reference"],
-        "contact": invoice["contact"],
-        "name": invoice["name"],
-    }
-    for invoice in invoices
-]
 
-# Collate the invoices by contact
-contacts = {}
-for invoice in invoices:
-    if invoice["contact_id"] in contacts:
-        contacts[invoice["contact_id"]].append(invoice)
-    else:
-        contacts[invoice["contact_id"]] = [invoice]
+def post_reminders(tenant: dict) -> bool:
+    """Post the list of contacts with overdue invoices to a tenant's admin channel.
 
-logging.debug(f"Collated invoices by contact, found {len(contacts)} contacts")
+    Returns False if the tenant's invoices couldn't be retrieved."""
+    # Each tenant gets its own HTTP pool and rate limit budget
+    session = tenants.session(tenant)
 
-# Clarify that this is only for contacts with invoices at least 7 days overdue
-
-app.client.chat_postMessage(  # type: ignore
-    channel=config["slack"]["admin_channel"],
-    text="This is a list of contacts with invoices at least 7 days overdue.",
-)
-
-# Iterate over contacts and look for invoices that are at least 7 days overdue
-
-for contact in contacts:
-    overdue_invoices = []
-    contact_info = None
-    for invoice in contacts[contact]:
-        if datetime.now() - invoice["due_date"] > timedelta(days=7):
-            overdue_invoices.append(invoice)
-        contact_info = invoice["contact"]
-
-    if overdue_invoices and contact_info:
-        # Set up block list
-        block_list = []
-
-        # Start building the invoice list
-        inv_list = []
-
-        total_owed = 0
-        for invoice in overdue_invoices:
-            # Add to the running total for the top message
-            total_owed += invoice["amount"]
+    # Set up Slack app
+    app = App(token=tenant["slack"]["bot_token"])
+    app.client.retry_handlers.append(
+        RateLimitErrorRetryHandler(max_retry_count=tenant["http"]["retries"])
+    )
 
-            # Add to the list
-            inv_list.append(
-                f"${invoice['amount']} - <https://artifactory.tidyhq.com/finances/invoices/{invoice['id']}|{invoice['name']}> (Due {(datetime.now() - invoice['due_date']).days} days ago)"
+    # Get a list of all invoices
+    try:
+        # create datetime for 90 days ago
+        query_date = datetime.now() - timedelta(days=90)
+        logging.info(f"Getting invoices from TidyHQ for {tenant['id']}")
+        r = session.get(
+            tenant["urls"]["invoices"],
+            params={
+                "access_token": tenant["tidyhq"]["token"],
+                "limit": 10000,
+                "updated_since": query_date.isoformat(),
+            },
+        )
+        invoices = r.json()
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Could not reach TidyHQ for {tenant['id']}")
+        return False
+
+    logging.debug(f"Found {len(invoices)} invoices")
+
+    # Trim invoices to only include those that have not been paid
+    invoices = [invoice for invoice in invoices if not invoice["paid"]]
+
+    # TidyHQ includes a lot of extra data in the invoices, so we'll trim it down to just the fields we need
+    invoices = [
+        {
+            "id": invoice["id"],
+            "amount": invoice["outstanding_amount"],
+            "due_date": datetime.strptime(invoice["due_date"], "%Y-%m-%d"),
+            "contact_id": invoice["contact"]["contact_id_reference"],
+            "contact": invoice["contact"],
+            "name": invoice["name"],
+        }
+        for invoice in invoices
+    ]
+
+    # Collate the invoices by contact
+    contacts = {}
+    for invoice in invoices:
+        if invoice["contact_id"] in contacts:
+            contacts[invoice["contact_id"]].append(invoice)
+        else:
+            contacts[invoice["contact_id"]] = [invoice]
+
+    logging.debug(f"Collated invoices by contact, found {len(contacts)} contacts")
+
+    # Look up when each contact was last reminded and skip or deprioritize anyone reminded recently
+    ledger = Ledger(tenant["ledger"])
+    window = tenant["reminder_window"]
+    last_reminded = {contact: ledger.days_since(contact) for contact in contacts}
+    recent = {
+        contact
+        for contact, days in last_reminded.items()
+        if days is not None and days < window["days"]
+    }
+    skipped_names = []
+    if recent and window["action"] == "skip":
+        # Only mention skipped contacts that would otherwise have been listed
+        skipped_names = sorted(
+            contacts[contact][0]["contact"]["display_name"]
+            for contact in recent
+            if any(
+                datetime.now() - invoice["due_date"] > timedelta(days=7)
+                for invoice in contacts[contact]
             )
+        )
+        logging.info(
+            f"Skipping {len(skipped_names)} contacts reminded within the last {window['days']} days"
+        )
+        contacts = {
+            contact: contact_invoices
+            for contact, contact_invoices in contacts.items()
+            if contact not in recent
+        }
+    elif recent:
+        contacts = dict(sorted(contacts.items(), key=lambda item: item[0] in recent))
+
+    # Clarify that this is only for contacts with invoices at least 7 days overdue
+
+    intro = "This is a list of contacts with invoices at least 7 days overdue."
+    if skipped_names:
+        intro += f" {len(skipped_names)} {'contact was' if len(skipped_names) == 1 else 'contacts were'} left out as they were reminded within the last {window['days']} days: {', '.join(skipped_names)}."
+
+    app.client.chat_postMessage(  # type: ignore
+        channel=tenant["slack"]["admin_channel"],
+        text=intro,
+    )
 
-        text = f"{contact_info['display_name']} owes ${total_owed} across {len(overdue_invoices)} {'invoice' if len(overdue_invoices) == 1 else 'invoices'}"
-
-        # Add text block
-        block_list.append(copy(blocks.text))
-        block_list[-1]["text"]["text"] = text
-        block_list[-1]["block_id"] = "header"
-
-        # Add divider
-        block_list.append(copy(blocks.divider))
-
-        # Add list
-        block_list.append(copy(blocks.text))
-        block_list[-1]["text"]["text"] = "• " + "\n• ".join(inv_list)
-        block_list[-1]["block_id"] = "message"
-
-        # Add divider
-        block_list.append(copy(blocks.divider))
-
-        # Set up action block
-        action_block = copy(blocks.actions)
-
-        # Set up confirm object
-        confirm = copy(blocks.confirm)
-        confirm["title"]["text"] = "Are you sure?"
-        confirm["text"][
-            "text"
-        ] = f"This will send a reminder to {contact_info['display_name']}. Make sure that there aren't any pending bank transactions from this contact and that they haven't already been reminded recently."
-        confirm["confirm"]["text"] = "Yes, remind them"
-        confirm["deny"]["text"] = "No, abort"
-
-        # Check if the contact has a Slack ID
-        if contact_info["custom_fields"].get(
-            config["tidyhq"]["IDs"]["slack"], {"value": None}
-        )["value"]:
-            slack_id = contact_info["custom_fields"][config["tidyhq"]["IDs"]["slack"]][
-                "value"
-            ]
+    # Iterate over contacts and look for invoices that are at least 7 days overdue
+
+    for contact in contacts:
+        overdue_invoices = []
+        contact_info = None
+        for invoice in contacts[contact]:
+            if datetime.now() - invoice["due_date"] > timedelta(days=7):
+                overdue_invoices.append(invoice)
+            contact_info = invoice["contact"]
+
+        if overdue_invoices and contact_info:
+            # Set up block list
+            block_list = []
+
+            # Start building the invoice list
+            inv_list = []
+
+            total_owed = 0
+            for invoice in overdue_invoices:
+                # Add to the running total for the top message
+                total_owed += invoice["amount"]
+
+                # Add to the list
+                inv_list.append(
+                    f"${invoice['amount']} - <{tenant['tidyhq']['url']}/finances/invoices/{invoice['id']}|{invoice['name']}> (Due {(datetime.now() - invoice['due_date']).days} days ago)"
+                )
+
+            text = f"{contact_info['display_name']} owes ${total_owed} across {len(overdue_invoices)} {'invoice' if len(overdue_invoices) == 1 else 'invoices'}"
+
+            # Add text block
+            block_list.append(copy(blocks.text))
+            block_list[-1]["text"]["text"] = text
+            block_list[-1]["block_id"] = "header"
+
+            # Add when the contact was last reminded, if ever
+            last_reminder = ledger.last(contact)
+            reminder_text = ""
+            if last_reminder:
+                days = last_reminded[contact]
+                via = "Slack" if last_reminder["via"] == "slack" else "email"
+                if days == 0:
+                    when = "today"
+                else:
+                    when = f"{days} {'day' if days == 1 else 'days'} ago"
+                reminder_text = f"Last reminded {when} via {via}."
+                block_list.append(copy(blocks.context))
+                block_list[-1]["elements"][0]["text"] = reminder_text
+
+            # Add divider
+            block_list.append(copy(blocks.divider))
+
+            # Add list
+            block_list.append(copy(blocks.text))
+            block_list[-1]["text"]["text"] = "• " + "\n• ".join(inv_list)
+            block_list[-1]["block_id"] = "message"
+
+            # Add divider
+            block_list.append(copy(blocks.divider))
+
+            # Set up action block
+            action_block = copy(blocks.actions)
+
+            # Tag the action block with the tenant so the listener knows who the buttons belong to
+            action_block["block_id"] = tenant["id"]
+
+            # Set up confirm object
+            confirm = copy(blocks.confirm)
+            confirm["title"]["text"] = "Are you sure?"
+            confirm["text"][
+                "text"
+            ] = f"This will send a reminder to {contact_info['display_name']}. Make sure that there aren't any pending bank transactions from this contact and that they haven't already been reminded recently. {reminder_text}".strip()
+            confirm["confirm"]["text"] = "Yes, remind them"
+            confirm["deny"]["text"] = "No, abort"
+
+            # Check if the contact has a Slack ID
+            if contact_info["custom_fields"].get(
+                tenant["tidyhq"]["IDs"]["slack"], {"value": None}
+            )["value"]:
+                slack_id = contact_info["custom_fields"][
+                    tenant["tidyhq"]["IDs"]["slack"]
+                ]["value"]
+
+                # Create remind button
+                slack_remind_button = copy(blocks.button)
+                slack_remind_button["text"]["text"] = "Remind via Slack"
+                slack_remind_button["value"] = f"{contact}_{slack_id}"
+                slack_remind_button["action_id"] = "slack_remind"
+                slack_remind_button["confirm"] = confirm
+
+                # Add remind button to action block
+                action_block["elements"].append(slack_remind_button)
 
             # Create remind button
-            slack_remind_button = copy(blocks.button)
-            slack_remind_button["text"]["text"] = "Remind via Slack"
-            slack_remind_button["value"] = f"{contact}_{slack_id}"
-            slack_remind_button["action_id"] = "slack_remind"
-            slack_remind_button["confirm"] = confirm
+            tidyhq_remind_button = copy(blocks.button)
+            tidyhq_remind_button["text"]["text"] = "Remind via TidyHQ"
+            tidyhq_remind_button["value"] = f"{contact}_NOSLACKID"
+            tidyhq_remind_button["action_id"] = "tidyhq_remind"
+            tidyhq_remind_button["confirm"] = confirm
 
             # Add remind button to action block
-            action_block["elements"].append(slack_remind_button)
-
-        # Create remind button
-        tidyhq_remind_button = copy(blocks.button)
-        tidyhq_remind_button["text"]["text"] = "Remind via TidyHQ"
-        tidyhq_remind_button["value"] = f"{contact}_NOSLACKID"
-        tidyhq_remind_button["action_id"] = "tidyhq_remind"
-        tidyhq_remind_button["confirm"] = confirm
-
-        # Add remind button to action block
-        action_block["elements"].append(tidyhq_remind_button)
-
-        # Create view invoices button
-        view_invoices_button = copy(blocks.link_button)
-        view_invoices_button["text"]["text"] = "View Invoices"
-        view_invoices_button["url"] = (
-            f"https://artifactory.tidyhq.com/contacts/{contact}/finances"
-        )
-        view_invoices_button["action_id"] = "view_invoices_admin"
-        view_invoices_button["value"] = str(contact)
-
-        # Add view invoices button to action block
-        action_block["elements"].append(view_invoices_button)
-
-        # Create delete invoices button
-        delete_invoices_button = copy(blocks.button)
-        delete_invoices_button["text"]["text"] = "Delete invoices"
-        delete_invoices_button["value"] = f"{contact}_NOSLACKID"
-        delete_invoices_button["action_id"] = "delete_invoices"
-        delete_invoices_button["style"] = "danger"
-
-        # Set up confirm object
-        delete_confirm = copy(blocks.confirm)
-        delete_confirm["title"]["text"] = "Delete listed invoices?"
-        delete_confirm["text"][
-            "text"
-        ] = f"This will delete the listed invoices for {contact_info['display_name']} totalling ${total_owed}. This process cannot be undone."
-        delete_confirm["confirm"]["text"] = "Yes, delete them"
-        delete_confirm["deny"]["text"] = "No, abort"
-        delete_confirm["style"] = "danger"  # type: ignore
-
-        # Add confirm object to delete button
-        delete_invoices_button["confirm"] = delete_confirm
-
-        # Add delete invoices button to action block
-        action_block["elements"].append(delete_invoices_button)
-
-        # Add action block to block list
-        block_list.append(action_block)
-
-        # Send Slack message
-        app.client.chat_postMessage(  # type: ignore
-            channel=config["slack"]["admin_channel"],
-            text=text,
-            blocks=block_list,
-        )
+            action_block["elements"].append(tidyhq_remind_button)
+
+            # Create view invoices button
+            view_invoices_button = copy(blocks.link_button)
+            view_invoices_button["text"]["text"] = "View Invoices"
+            view_invoices_button["url"] = (
+                f"{tenant['tidyhq']['url']}/contacts/{contact}/finances"
+            )
+            view_invoices_button["action_id"] = "view_invoices_admin"
+            view_invoices_button["value"] = str(contact)
+
+            # Add view invoices button to action block
+            action_block["elements"].append(view_invoices_button)
+
+            # Create delete invoices button
+            delete_invoices_button = copy(blocks.button)
+            delete_invoices_button["text"]["text"] = "Delete invoices"
+            delete_invoices_button["value"] = f"{contact}_NOSLACKID"
+            delete_invoices_button["action_id"] = "delete_invoices"
+            delete_invoices_button["style"] = "danger"
+
+            # Set up confirm object
+            delete_confirm = copy(blocks.confirm)
+            delete_confirm["title"]["text"] = "Delete listed invoices?"
+            delete_confirm["text"][
+                "text"
+            ] = f"This will delete the listed invoices for {contact_info['display_name']} totalling ${total_owed}. This process cannot be undone."
+            delete_confirm["confirm"]["text"] = "Yes, delete them"
+            delete_confirm["deny"]["text"] = "No, abort"
+            delete_confirm["style"] = "danger"  # type: ignore
+
+            # Add confirm object to delete button
+            delete_invoices_button["confirm"] = delete_confirm
+
+            # Add delete invoices button to action block
+            action_block["elements"].append(delete_invoices_button)
+
+            # Add action block to block list
+            block_list.append(action_block)
+
+            # Send Slack message
+            app.client.chat_postMessage(  # type: ignore
+                channel=tenant["slack"]["admin_channel"],
+                text=text,
+                blocks=block_list,
+            )
+
+    return True
+
+
+if __name__ == "__main__":
+    shared, tenant_configs = tenants.load()
+
+    # Run each tenant in its own process so one slow organisation doesn't hold up the rest
+    results = {}
+    with ProcessPoolExecutor(
+        max_workers=shared.get("workers", len(tenant_configs))
+    ) as executor:
+        futures = {
+            tenant_id: executor.submit(post_reminders, tenant)
+            for tenant_id, tenant in tenant_configs.items()
+        }
+        for tenant_id, future in futures.items():
+            # Keep one tenant's failure from discarding everyone else's results
+            try:
+                results[tenant_id] = future.result()
+            except Exception:
+                logging.exception(f"Posting reminders for {tenant_id} failed")
+                results[tenant_id] = False
+
+    failed = [tenant_id for tenant_id, result in results.items() if not result]
+    if failed:
+        logging.error(f"Could not post reminders for: {', '.join(failed)}")
+        sys.exit(1)
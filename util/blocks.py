@@ -46,3 +46,8 @@ confirm = {
     "confirm": {"type": "plain_text", "text": ""},
     "deny": {"type": "plain_text", "text": ""},
 }
+
+context = {
+    "type": "context",
+    "elements": [{"type": "mrkdwn", "text": ""}],
+}
@@ -0,0 +1,92 @@
+import html
+import re
+
+# Matches a single invoice line as posted by reminder_post.py:
+# • $12.5 - <https://.../finances/invoices/abc123|Invoice name> (Due 10 days ago)
+# The name is matched greedily up to the final "> (Due" so stray |, < or > in invoice names survive
+invoice_line = re.compile(
+    r"^•?[ \t]*\$(?P<amount>[0-9.,-]+) - <[^|>\n]*/invoices/(?P<id>[a-zA-Z0-9_]*)\|(?P<name>.*)> \(Due (?P<days>-?\d+) days ago\)[ \t]*$",
+    re.MULTILINE,
+)
+
+# Email templates, filled in with str.format
+templates = {
+    "reminder_html": (
+        "Hello {name},<br><br>"
+        "As a reminder you have an outstanding balance of ${total}. (Excluding invoices that aren't at least 7 days overdue)<br><br>"
+        "{invoices}<br><br>"
+        'If you have any questions or concerns, please don\'t hesitate to reach out to us at <a href="mailto:{contact_email}">{contact_email}</a>.<br><br>'
+        "Thank you for your support,<br>{signature}"
+    ),
+    "reminder_text": (
+        "Hello {name},\n\n"
+        "As a reminder you have an outstanding balance of ${total}. (Excluding invoices that aren't at least 7 days overdue)\n\n"
+        "{invoices}\n\n"
+        "If you have any questions or concerns, please don't hesitate to reach out to us at {contact_email}.\n\n"
+        "Thank you for your support,\n{signature}"
+    ),
+    "invoice_html": "• ${amount} - <a href='{url}'>{name}</a> (Due {days} days ago)",
+    "invoice_text": "• ${amount} - {name}: {url} (Due {days} days ago)",
+}
+
+# How each body format escapes values and joins lines
+formats = {
+    "html": (html.escape, "<br>"),
+    "text": (str, "\n"),
+}
+
+
+def parse_invoices(message: str) -> list[dict]:
+    """Turn the invoice list from a report message back into structured invoices.
+
+    Slack returns &, < and > as HTML entities so names are unescaped here.
+    Lines that don't look like an invoice are skipped."""
+    invoices = []
+    for match in invoice_line.finditer(message):
+        invoice = match.groupdict()
+        invoice["name"] = html.unescape(invoice["name"])
+        invoices.append(invoice)
+    return invoices
+
+
+def render_invoices(
+    invoices: list[dict], public_url: str, body_format: str = "html"
+) -> str:
+    """Render a list of invoices, pointing each at the public invoice url.
+
+    public_url is a format string that takes the invoice ID. Amounts, days and
+    IDs are expected to be numeric/alphanumeric so only names are escaped."""
+    template = templates[f"invoice_{body_format}"].format
+    escape, separator = formats[body_format]
+    public_url = escape(public_url)
+    return separator.join(
+        [
+            template(
+                amount=invoice["amount"],
+                url=public_url.format(invoice["id"]),
+                name=escape(invoice["name"]),
+                days=invoice["days"],
+            )
+            for invoice in invoices
+        ]
+    )
+
+
+def reminder(
+    name: str,
+    total: str,
+    invoices: list[dict],
+    public_url: str,
+    contact_email: str,
+    signature: str,
+    body_format: str = "html",
+) -> str:
+    """Render the invoice reminder email body as either "html" or "text" """
+    escape, _ = formats[body_format]
+    return templates[f"reminder_{body_format}"].format(
+        name=escape(name),
+        total=escape(total),
+        invoices=render_invoices(invoices, public_url, body_format=body_format),
+        contact_email=escape(contact_email),
+        signature=escape(signature),
+    )
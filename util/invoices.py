@@ -0,0 +1,120 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+
+class InvoiceCache:
+    """Short lived cache of TidyHQ invoice statuses.
+
+    Rather than looking invoices up one at a time the whole cache is refreshed in
+    one request, asking TidyHQ only for invoices updated since the last refresh."""
+
+    def __init__(
+        self,
+        url: str,
+        token: str,
+        ttl: int = 300,
+        lookback: int = 90,
+        cooldown: int = 60,
+        session: requests.Session | None = None,
+    ) -> None:
+        self.url = url
+        self.token = token
+        self.ttl = timedelta(seconds=ttl)
+        self.lookback = timedelta(days=lookback)
+        self.cooldown = timedelta(seconds=cooldown)
+        self.invoices: dict[str, dict] = {}
+        self.refreshed: datetime | None = None
+        self.failed: datetime | None = None
+        self.refreshing = False
+        # Only guards the cached data, never held while talking to TidyHQ
+        self.lock = threading.Lock()
+        self.http = session or requests
+
+    def stale(self) -> bool:
+        return (
+            self.refreshed is None
+            or datetime.now(timezone.utc) - self.refreshed > self.ttl
+        )
+
+    def should_refresh(self) -> bool:
+        """Refresh when stale, unless another thread is already refreshing or a recent refresh failed"""
+        cooling_down = (
+            self.failed and datetime.now(timezone.utc) - self.failed < self.cooldown
+        )
+        return self.stale() and not self.refreshing and not cooling_down
+
+    def refresh(self) -> None:
+        """Pull every invoice updated since the last refresh (or within the lookback window on first run)"""
+        # Times are kept in UTC and sent with their offset so TidyHQ can't misread them as local time
+        started = datetime.now(timezone.utc)
+        # Overlap the previous refresh slightly so clock differences don't drop updates
+        since = (
+            self.refreshed - timedelta(minutes=1)
+            if self.refreshed
+            else started - self.lookback
+        )
+        logging.info(f"Refreshing invoice cache with changes since {since}")
+        r = self.http.get(
+            self.url,
+            params={
+                "access_token": self.token,
+                "limit": 10000,
+                "updated_since": since.isoformat(),
+            },
+        )
+        r.raise_for_status()
+        with self.lock:
+            for invoice in r.json():
+                self.invoices[str(invoice["id"])] = {
+                    "paid": invoice["paid"],
+                    "amount": invoice["outstanding_amount"],
+                }
+            self.refreshed = started
+            self.failed = None
+
+    def outstanding(self, invoice_ids: list[str]) -> tuple[list[str], list[str]]:
+        """Split invoice IDs into those still outstanding and those that aren't.
+
+        Invoices TidyHQ hasn't told us about are assumed to still be outstanding.
+        If TidyHQ can't be reached whatever is already cached is used and
+        refreshing is paused for the cooldown period."""
+        with self.lock:
+            refresh = self.should_refresh()
+            if refresh:
+                self.refreshing = True
+
+        if refresh:
+            try:
+                self.refresh()
+            except requests.exceptions.RequestException:
+                logging.error(
+                    f"Could not refresh invoice cache, retrying in {self.cooldown.seconds}s"
+                )
+                with self.lock:
+                    self.failed = datetime.now(timezone.utc)
+            finally:
+                with self.lock:
+                    self.refreshing = False
+
+        with self.lock:
+            invoices = [
+                (invoice_id, self.invoices.get(str(invoice_id)))
+                for invoice_id in invoice_ids
+            ]
+
+        outstanding = []
+        skipped = []
+        for invoice_id, invoice in invoices:
+            if invoice and (invoice["paid"] or invoice["amount"] <= 0):
+                skipped.append(invoice_id)
+            else:
+                outstanding.append(invoice_id)
+        return outstanding, skipped
+
+    def close(self, invoice_id: str) -> None:
+        """Record that we've closed an invoice ourselves (e.g. deleted it)"""
+        with self.lock:
+            self.invoices[str(invoice_id)] = {"paid": False, "amount": 0}
@@ -0,0 +1,94 @@
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Lane:
+    """A bounded pool of workers for a class of Slack actions.
+
+    Actions are acknowledged as soon as they arrive and then queued on the lane.
+    Once workers + queue actions are waiting or running further actions are
+    rejected rather than queued indefinitely. Queue depth and the longest wait
+    since the last report are logged each time an action finishes."""
+
+    def __init__(self, name: str, workers: int, queue: int) -> None:
+        self.name = name
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix=f"lane-{name}"
+        )
+        self.slots = threading.BoundedSemaphore(workers + queue)
+        self.lock = threading.Lock()
+        self.stats = {
+            "queued": 0,
+            "running": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "max_wait": 0.0,
+        }
+
+    def _count(self, stat: str, change: int = 1) -> None:
+        with self.lock:
+            self.stats[stat] += change
+
+    def _run(self, func, submitted: float, *args) -> None:
+        wait = time.monotonic() - submitted
+        with self.lock:
+            self.stats["queued"] -= 1
+            self.stats["running"] += 1
+            self.stats["max_wait"] = max(self.stats["max_wait"], wait)
+        logging.debug(f"{self.name} lane started {func.__name__} after {wait:.2f}s")
+        started = time.monotonic()
+        try:
+            func(*args)
+            self._count("completed")
+        except Exception:
+            self._count("failed")
+            logging.exception(f"{func.__name__} failed on the {self.name} lane")
+        finally:
+            self._count("running", -1)
+            self.slots.release()
+            logging.info(
+                f"{self.name} lane finished {func.__name__} in {time.monotonic() - started:.2f}s ({self.metrics(reset=True)})"
+            )
+
+    def submit(self, func, *args) -> bool:
+        """Queue func on the lane, returns False if the lane is full"""
+        if not self.slots.acquire(blocking=False):
+            self._count("rejected")
+            logging.warning(
+                f"{self.name} lane is full, rejected {func.__name__} ({self.metrics()})"
+            )
+            return False
+        self._count("queued")
+        logging.debug(f"{self.name} lane queued {func.__name__} ({self.metrics()})")
+        self.executor.submit(self._run, func, time.monotonic(), *args)
+        return True
+
+    def metrics(self, reset: bool = False) -> dict:
+        """Get a snapshot of the lane's queue depth and counters, optionally resetting the longest wait"""
+        with self.lock:
+            snapshot = dict(self.stats)
+            if reset:
+                self.stats["max_wait"] = 0.0
+            return snapshot
+
+    def listener(self, func):
+        """Wrap a handler taking (body, client, logger) as a Bolt listener that acks immediately and runs it on this lane"""
+
+        @functools.wraps(func)
+        def listener(ack, body, client, logger):
+            ack()
+            if not self.submit(func, body, client, logger):
+                # Let whoever clicked know their action wasn't run
+                client.chat_postEphemeral(  # type: ignore
+                    channel=body["container"]["channel_id"],
+                    user=body["user"]["id"],
+                    text="We're a little busy right now and couldn't process that, please try again in a minute.",
+                )
+
+        # Bolt reads a listener's arguments from the unwrapped function, which doesn't take ack
+        del listener.__wrapped__
+        return listener
@@ -0,0 +1,54 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+
+class Ledger:
+    """Append only log of reminders, deletions and member responses.
+
+    Each event is a single JSON line. The file is read once on load to build an
+    index of the latest event of each type per contact, which is then kept up to
+    date as events are appended."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.index: dict[str, dict[str, dict]] = {}
+        self.lock = threading.Lock()
+
+        if not os.path.exists(path):
+            return
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    self._index(json.loads(line))
+                except json.JSONDecodeError:
+                    logging.warning(f"Skipping unreadable ledger line in {path}")
+
+    def _index(self, event: dict) -> None:
+        self.index.setdefault(str(event["contact"]), {})[event["event"]] = event
+
+    def append(self, contact, event: str, **details) -> None:
+        """Record an event against a TidyHQ contact ID"""
+        entry = {
+            "ts": int(datetime.now().timestamp()),
+            "contact": str(contact),
+            "event": event,
+            **details,
+        }
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._index(entry)
+
+    def last(self, contact, event: str = "reminded") -> dict | None:
+        """Get the most recent event of a type for a contact"""
+        return self.index.get(str(contact), {}).get(event)
+
+    def days_since(self, contact, event: str = "reminded") -> int | None:
+        """Get the number of days since a contact's most recent event of a type"""
+        entry = self.last(contact, event)
+        if not entry:
+            return None
+        return (datetime.now() - datetime.fromtimestamp(entry["ts"])).days
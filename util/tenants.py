@@ -0,0 +1,144 @@
+import json
+import logging
+from copy import deepcopy as copy
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Identity of the original single organisation setup, only used for configs without a "tenants" key
+legacy_defaults = {
+    "name": "the Artifactory",
+    "tidyhq": {"domain": "artifactory"},
+    "email": {
+        "contact": "treasurer@artifactory.org.au",
+        "signature": "Artifactory Committee",
+    },
+}
+
+# Settings that every tenant needs to identify itself to members
+required = [
+    ("name",),
+    ("email", "contact"),
+    ("email", "signature"),
+    ("tidyhq", "domain"),
+]
+
+# Values used when a tenant doesn't specify them
+defaults = {
+    # Contacts reminded within this many days are either skipped or posted last ("skip" or "deprioritize")
+    "reminder_window": {"days": 0, "action": "deprioritize"},
+    "http": {
+        # Connections kept open to each host per tenant
+        "pool": 10,
+        # Total retries allowed per request when rate limited (honouring Retry-After) or unable to connect
+        "retries": 5,
+        "backoff": 0.5,
+    },
+}
+
+
+def merge(base: dict, override: dict) -> dict:
+    """Recursively merge override into a copy of base"""
+    merged = copy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = copy(value)
+    return merged
+
+
+def load(path: str = "config.json") -> tuple[dict, dict[str, dict]]:
+    """Load the config file and split it into shared settings and per tenant configs.
+
+    A config without a "tenants" key is treated as a single tenant called "default"
+    using the original organisation's details. Every other top level key is shared
+    and can be overridden by each tenant.
+
+    Raises ValueError if a tenant is missing its name, email details or TidyHQ domain.
+    """
+    with open(path, "r") as f:
+        config: dict = json.load(f)
+
+    shared = {key: value for key, value in config.items() if key != "tenants"}
+    base = defaults if "tenants" in config else merge(defaults, legacy_defaults)
+    tenant_configs = config.get("tenants", {"default": {}})
+
+    tenants = {}
+    for tenant_id, tenant_config in tenant_configs.items():
+        tenant = merge(merge(base, shared), tenant_config)
+        for keys in required:
+            value = tenant
+            for key in keys:
+                value = value.get(key) if isinstance(value, dict) else None
+            if not value:
+                raise ValueError(
+                    f"Tenant {tenant_id} is missing {'.'.join(keys)} in {path}"
+                )
+        tenant["id"] = tenant_id
+        tenant["tidyhq"]["url"] = f"https://{tenant['tidyhq']['domain']}.tidyhq.com"
+        tenant.setdefault("ledger", f"ledger-{tenant_id}.jsonl")
+        if tenant["debug"]:
+            tenant["slack"]["admin_channel"] = "C05HB2Z82CT"
+        tenants[tenant_id] = tenant
+    return shared, tenants
+
+
+def session(tenant: dict) -> requests.Session:
+    """Create a HTTP session with its own connection pool and retry budget for a tenant"""
+    retry = Retry(
+        total=tenant["http"]["retries"],
+        # Don't retry once a request may have been processed, we'd risk duplicate emails and notes
+        read=False,
+        backoff_factor=tenant["http"]["backoff"],
+        status_forcelist=[429],
+        allowed_methods=None,
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=tenant["http"]["pool"],
+        pool_maxsize=tenant["http"]["pool"],
+        max_retries=retry,
+    )
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+def route(tenants: dict[str, dict], body: dict) -> dict | None:
+    """Work out which tenant a Slack interaction belongs to.
+
+    Messages we post tag their action block with the tenant ID. Older messages
+    fall back to the admin channel they were posted in, then the workspace if
+    only one tenant uses it. Returns None if the tenant can't be determined and
+    there's more than one."""
+    block_id = body.get("actions", [{}])[0].get("block_id", "")
+    if block_id in tenants:
+        return tenants[block_id]
+
+    channel_id = body.get("container", {}).get("channel_id") or body.get(
+        "channel", {}
+    ).get("id")
+    for tenant in tenants.values():
+        if tenant["slack"]["admin_channel"] == channel_id:
+            return tenant
+
+    # A workspace only identifies the tenant if no other tenant shares it
+    team_id = body.get("team", {}).get("id")
+    team_tenants = [
+        tenant
+        for tenant in tenants.values()
+        if team_id and tenant["slack"].get("team_id") == team_id
+    ]
+    if len(team_tenants) == 1:
+        return team_tenants[0]
+
+    if len(tenants) == 1:
+        return next(iter(tenants.values()))
+
+    logging.error(
+        f"Could not work out which tenant an interaction belongs to (block: {block_id}, channel: {channel_id}, team: {team_id})"
+    )
+    return None